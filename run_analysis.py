@@ -1,43 +1,135 @@
+import hashlib
 import os
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from functools import reduce
+from typing import Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
 
 import matplotlib.pyplot as plt
 import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
 import requests
 import urllib3
+from numba import njit
+from pandas.api.types import is_datetime64_any_dtype
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 SIX_MONTH_DAYS = 182
 
+# Only the fields used downstream; Arrow extracts them from the records in a single pass.
+RECORD_SCHEMA = pa.schema([("ltu", pa.string()), ("value", pa.float32())])
+
+WEEKDAY_NAMES = [
+    "Pirmadienis",
+    "Antradienis",
+    "Trečiadienis",
+    "Ketvirtadienis",
+    "Penktadienis",
+    "Šeštadienis",
+    "Sekmadienis",
+]
+
+CACHE_DIR = "cache"
+CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504]),
+    ),
+)
+
 
 def _limit_to_last_6_months(df: pd.DataFrame, date_col: str = "data") -> pd.DataFrame:
     """Limit DataFrame rows to the last ~6 months based on the newest timestamp in `date_col`.
 
+    The input is returned unchanged when no rows fall outside the window, so callers
+    that mutate the result should expect it may be the original frame. If no row has a
+    valid timestamp, an empty frame is returned.
+
     Args:
         df: Input DataFrame.
         date_col: Column name containing datetimes.
 
     Returns:
-        Filtered DataFrame (copy) containing only rows within the last ~6 months.
+        DataFrame containing only rows within the last ~6 months.
     """
     if df.empty or date_col not in df.columns:
         return df
 
-    df = df.copy()
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+    if not is_datetime64_any_dtype(df[date_col]):
+        dates = pd.to_datetime(df[date_col], format="ISO8601", cache=True, errors="coerce")
+        df = df.assign(**{date_col: dates})
     max_dt = df[date_col].max()
     if pd.isna(max_dt):
-        return df
+        return df.iloc[:0]
 
     cutoff = max_dt - timedelta(days=SIX_MONTH_DAYS)
-    return df[df[date_col] >= cutoff].copy()
+    mask = (df[date_col] >= cutoff).to_numpy()
+    if mask.all():
+        return df
+    return df.take(np.flatnonzero(mask))
+
+
+def _cache_path(category: str, dataset_id: str, start_date: str, end_date: str) -> str:
+    """Build the on-disk cache path for a single API request.
+
+    Args:
+        category: API category path segment.
+        dataset_id: Dataset identifier in the API.
+        start_date: Start date (YYYY-MM-DD).
+        end_date: End date (YYYY-MM-DD).
+
+    Returns:
+        Path to the Parquet file caching this request.
+    """
+    key = hashlib.sha1(f"{category}/{dataset_id}/{start_date}/{end_date}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def _write_cache(cache_path: str, data: list) -> None:
+    """Atomically write API records to the on-disk cache, ignoring any failure.
+
+    Args:
+        cache_path: Destination Parquet path from `_cache_path`.
+        data: Parsed API records.
+
+    Returns:
+        None. On failure the cache is left untouched and a warning is printed.
+    """
+    tmp_path = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        pd.DataFrame(data).to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"  Nepavyko įrašyti talpyklos {os.path.basename(cache_path)}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def fetch_dataset(category: str, dataset_id: str, start_date: str, end_date: str):
-    """Fetch dataset JSON from Litgrid Open API with simple retry logic.
+    """Fetch dataset JSON from Litgrid Open API using the shared pooled session.
+
+    Retries on connection errors and 5xx responses are handled by the session adapter.
+    When the LITGRID_CACHE=1 environment variable is set, responses are cached on disk
+    for up to a day and reused on subsequent runs.
 
     Args:
         category: API category path segment (e.g., 'gamyba', 'vartojimas').
@@ -51,15 +143,25 @@ def fetch_dataset(category: str, dataset_id: str, start_date: str, end_date: str
     url = f"https://openapi.litgrid.eu/v1/kategorijos/{category}/{dataset_id}"
     params = {"nuo": start_date, "iki": end_date}
 
-    for attempt in range(3):
-        try:
-            response = requests.get(url, params=params, timeout=120, verify=False)
-            if response.status_code == 200:
-                return response.json()
-            print(f"  Bandymas {attempt + 1} nepavyko su statusu {response.status_code}")
-        except Exception as e:
-            print(f"  Bandymas {attempt + 1} nepavyko su klaida: {e}")
-        time.sleep(5)
+    use_cache = os.environ.get("LITGRID_CACHE") == "1"
+    cache_path = _cache_path(category, dataset_id, start_date, end_date)
+    if use_cache and os.path.exists(cache_path):
+        if time.time() - os.path.getmtime(cache_path) < CACHE_MAX_AGE_SECONDS:
+            try:
+                return pd.read_parquet(cache_path).to_dict("records")
+            except Exception as e:
+                print(f"  Nepavyko nuskaityti talpyklos {category}/{dataset_id}: {e}")
+
+    try:
+        response = SESSION.get(url, params=params, timeout=120, verify=False)
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            if use_cache and data:
+                _write_cache(cache_path, data)
+            return data
+        print(f"  Užklausa {category}/{dataset_id} nepavyko su statusu {response.status_code}")
+    except Exception as e:
+        print(f"  Užklausa {category}/{dataset_id} nepavyko su klaida: {e}")
 
     return []
 
@@ -86,39 +188,61 @@ def fetch_all_data() -> pd.DataFrame:
         "203": "Vartojimas",
     }
 
-    all_dfs = []
+    all_series = []
     print(f"Nuskaitomi duomenys nuo {start_date} iki {end_date}...")
 
+    with ThreadPoolExecutor(max_workers=len(datasets)) as executor:
+        futures = {}
+        for ds_id, name in datasets.items():
+            cat = "gamyba" if ds_id.startswith("1") else "vartojimas"
+            print(f"Nuskaitoma: {name} ({ds_id})...")
+            futures[executor.submit(fetch_dataset, cat, ds_id, start_date, end_date)] = name
+
+        results = {futures[future]: future.result() for future in as_completed(futures)}
+
     for ds_id, name in datasets.items():
-        cat = "gamyba" if ds_id.startswith("1") else "vartojimas"
-        print(f"Nuskaitoma: {name} ({ds_id})...")
-        data = fetch_dataset(cat, ds_id, start_date, end_date)
+        data = results[name]
 
         if data:
-            df = pd.DataFrame(data)
-            if "ltu" in df.columns and "value" in df.columns:
-                df = df[["ltu", "value"]].rename(columns={"value": name, "ltu": "data"})
-                df["data"] = pd.to_datetime(df["data"])
-                df = df.drop_duplicates(subset="data").set_index("data")
-                all_dfs.append(df)
-                print(f"  Gauta {len(df)} įrašų.")
+            if "ltu" in data[0] and "value" in data[0]:
+                table = pa.Table.from_pylist(data, schema=RECORD_SCHEMA)
+                idx = pd.to_datetime(
+                    table.column("ltu").to_numpy(zero_copy_only=False),
+                    format="ISO8601",
+                    cache=True,
+                    errors="coerce",
+                )
+                idx.name = "data"
+                vals = table.column("value").to_numpy()
+                series = pd.Series(vals, index=idx, name=name)
+                series = series[series.index.notna() & ~series.index.duplicated()]
+                if series.empty:
+                    print(f"  {name} ({ds_id}): nenumatytas laiko formatas ({data[0]['ltu']!r})")
+                    continue
+                all_series.append(series)
+                print(f"  {name} ({ds_id}): gauta {len(series)} įrašų.")
             else:
-                print(f"  Nenumatytos stulpelių antraštės: {df.columns}")
+                print(f"  {name} ({ds_id}): nenumatytos stulpelių antraštės: {list(data[0])}")
         else:
-            print(f"  Duomenų negauta: {name}")
+            print(f"  {name} ({ds_id}): duomenų negauta.")
 
-        time.sleep(1)
-
-    if not all_dfs:
+    if not all_series:
         return pd.DataFrame()
 
-    final_df = pd.concat(all_dfs, axis=1, join="outer").sort_index().reset_index()
-    final_df = _limit_to_last_6_months(final_df, "data")
-    return final_df
+    union = reduce(lambda a, b: a.union(b), (series.index for series in all_series))
+    union.name = "data"
+    out = np.full((len(union), len(all_series)), np.nan, dtype=np.float32)
+    for i, series in enumerate(all_series):
+        out[union.get_indexer(series.index), i] = series.to_numpy()
+
+    final_df = pd.DataFrame(out, index=union, columns=[series.name for series in all_series])
+    return final_df.sort_index().reset_index()
 
 
 def process_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Process raw data: fill missing values, compute total generation and imbalance.
+    """Process raw data: fill missing consumption, compute total generation and imbalance.
+
+    Missing generation values are treated as 0 when summing, without rewriting the source columns.
 
     Args:
         df: Input DataFrame containing 'data' and generation/consumption columns.
@@ -130,18 +254,61 @@ def process_data(df: pd.DataFrame) -> pd.DataFrame:
         print("Duomenų apdorojimas nutrauktas: DataFrame tuščias.")
         return df
 
-    df = _limit_to_last_6_months(df, "data")
     sources = ["Kaupimo", "Saules", "Kitu", "Siluminiu", "Hidro", "Vejo"]
 
-    df[sources] = df[sources].fillna(0)
     df["Vartojimas"] = df["Vartojimas"].ffill()
+    numeric = sources + ["Vartojimas"]
+    df[numeric] = df[numeric].astype(np.float32, copy=False)
 
-    df["Sumine_Generacija"] = df[sources].sum(axis=1)
-    df["Disbalansas"] = df["Sumine_Generacija"] - df["Vartojimas"]
+    generation = df[sources].to_numpy(dtype=np.float32, na_value=0.0)
+    df["Sumine_Generacija"] = generation.sum(axis=1)
+    df["Disbalansas"] = df["Sumine_Generacija"].to_numpy() - df["Vartojimas"].to_numpy(
+        dtype=np.float32
+    )
 
     return df
 
 
+def _decimate(x: np.ndarray, y: np.ndarray, n: int = 1500) -> Tuple[np.ndarray, np.ndarray]:
+    """Downsample a series by striding so that roughly `n` points remain for plotting.
+
+    Args:
+        x: X values (e.g., timestamps).
+        y: Y values aligned with `x`.
+        n: Target number of points.
+
+    Returns:
+        Tuple of (x, y), strided if longer than `n`, otherwise unchanged.
+    """
+    if len(x) <= n:
+        return x, y
+    step = -(-len(x) // n)
+    return x[::step], y[::step]
+
+
+def _render_pie(month: str, sums: dict) -> None:
+    """Render and save the generation mix pie chart for a single month.
+
+    Args:
+        month: Month label (e.g., '2025-07'), used in the title and file name.
+        sums: Mapping of generation source name to its total for the month.
+
+    Returns:
+        None. Saves 'pie_charts/gamyba_<month>.png' if any source has positive output.
+    """
+    monthly_sums = pd.Series(sums)
+    monthly_sums = monthly_sums[monthly_sums > 0]
+    if monthly_sums.empty:
+        return
+
+    plt.figure(figsize=(8, 8))
+    plt.pie(monthly_sums, labels=monthly_sums.index, autopct="%1.1f%%", startangle=140)
+    plt.title(f"Gamybos šaltinių pasiskirstymas - {month}")
+    plt.tight_layout()
+    plt.savefig(f"pie_charts/gamyba_{month}.png")
+    plt.close()
+
+
 def create_visualizations(df: pd.DataFrame) -> None:
     """Create plots for the last ~6 months: generation vs consumption, imbalance, monthly pies.
 
@@ -155,71 +322,111 @@ def create_visualizations(df: pd.DataFrame) -> None:
         print("Vizualizacijos nutrauktos: DataFrame tuščias.")
         return
 
-    df = _limit_to_last_6_months(df, "data")
-
-    plt.figure(figsize=(12, 6))
-    plt.plot(df["data"], df["Sumine_Generacija"], label="Suminė generacija", alpha=0.7)
-    plt.plot(df["data"], df["Vartojimas"], label="Vartojimas", alpha=0.7)
-    plt.title("Elektros generacija ir vartojimas (paskutiniai 6 mėn.)")
-    plt.xlabel("Data")
-    plt.ylabel("MW")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig("generacija_vartojimas.png")
-    plt.close()
+    dates = df["data"].to_numpy()
+    plot_dates, generation = _decimate(dates, df["Sumine_Generacija"].to_numpy())
+    _, consumption = _decimate(dates, df["Vartojimas"].to_numpy())
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(plot_dates, generation, label="Suminė generacija", alpha=0.7)
+    ax.plot(plot_dates, consumption, label="Vartojimas", alpha=0.7)
+    ax.set_title("Elektros generacija ir vartojimas (paskutiniai 6 mėn.)")
+    ax.set_xlabel("Data")
+    ax.set_ylabel("MW")
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig("generacija_vartojimas.png")
+    ax.clear()
     print("Išsaugotas grafikas: generacija_vartojimas.png")
 
-    plt.figure(figsize=(12, 6))
-    plt.fill_between(
-        df["data"],
-        df["Disbalansas"],
+    plot_dates, imbalance = _decimate(dates, df["Disbalansas"].to_numpy())
+
+    ax.fill_between(
+        plot_dates,
+        imbalance,
         0,
-        where=(df["Disbalansas"] >= 0),
+        where=(imbalance >= 0),
         color="green",
         alpha=0.3,
         label="Perteklius",
     )
-    plt.fill_between(
-        df["data"],
-        df["Disbalansas"],
+    ax.fill_between(
+        plot_dates,
+        imbalance,
         0,
-        where=(df["Disbalansas"] < 0),
+        where=(imbalance < 0),
         color="red",
         alpha=0.3,
         label="Trūkumas",
     )
-    plt.plot(df["data"], df["Disbalansas"], color="black", linewidth=0.5, alpha=0.5)
-    plt.title("Elektros gamybos ir vartojimo disbalansas")
-    plt.xlabel("Data")
-    plt.ylabel("MW")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig("disbalansas.png")
-    plt.close()
+    ax.plot(plot_dates, imbalance, color="black", linewidth=0.5, alpha=0.5)
+    ax.set_title("Elektros gamybos ir vartojimo disbalansas")
+    ax.set_xlabel("Data")
+    ax.set_ylabel("MW")
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig("disbalansas.png")
+    plt.close(fig)
     print("Išsaugotas grafikas: disbalansas.png")
 
     sources = ["Kaupimo", "Saules", "Kitu", "Siluminiu", "Hidro", "Vejo"]
-    df["month"] = df["data"].dt.to_period("M")
+    month = df["data"].dt.to_period("M").astype("category")
     os.makedirs("pie_charts", exist_ok=True)
 
-    for month in df["month"].unique():
-        month_data = df[df["month"] == month]
-        monthly_sums = month_data[sources].sum()
-        monthly_sums = monthly_sums[monthly_sums > 0]
-
-        if not monthly_sums.empty:
-            plt.figure(figsize=(8, 8))
-            plt.pie(monthly_sums, labels=monthly_sums.index, autopct="%1.1f%%", startangle=140)
-            plt.title(f"Gamybos šaltinių pasiskirstymas - {month}")
-            plt.tight_layout()
-            plt.savefig(f"pie_charts/gamyba_{month}.png")
-            plt.close()
+    jobs = [
+        (str(m), month_data.sum().to_dict())
+        for m, month_data in df[sources].groupby(month, sort=False, observed=True)
+    ]
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+            list(executor.map(_render_pie, *zip(*jobs)))
 
     print("Išsaugoti mėnesio pyragų grafikai 'pie_charts' kataloge.")
 
 
+@njit(cache=True)
+def _fused_stats(
+    hydro: np.ndarray, consumption: np.ndarray, day_of_week: np.ndarray, hour: np.ndarray
+):
+    """Compute hydro start/active counts and weekday/hour-of-week consumption totals in one pass.
+
+    Args:
+        hydro: Hydro generation per row (NaN already replaced with 0).
+        consumption: Consumption per row; NaN rows are excluded from the totals.
+        day_of_week: Day of week per row (0 = Monday).
+        hour: Hour of day per row.
+
+    Returns:
+        Tuple of (total_starts, total_hours, wd_sum, wd_cnt, hw_sum, hw_cnt), where the
+        weekday arrays have 7 bins and the hour-of-week arrays have 168 bins.
+    """
+    total_starts = 0
+    total_hours = 0
+    wd_sum = np.zeros(7, dtype=np.float64)
+    wd_cnt = np.zeros(7, dtype=np.int64)
+    hw_sum = np.zeros(168, dtype=np.float64)
+    hw_cnt = np.zeros(168, dtype=np.int64)
+
+    prev_active = False
+    for i in range(hydro.shape[0]):
+        active = hydro[i] > 0
+        if active:
+            total_hours += 1
+            if not prev_active:
+                total_starts += 1
+        prev_active = active
+
+        value = consumption[i]
+        if not np.isnan(value):
+            wd_sum[day_of_week[i]] += value
+            wd_cnt[day_of_week[i]] += 1
+            hw_sum[day_of_week[i] * 24 + hour[i]] += value
+            hw_cnt[day_of_week[i] * 24 + hour[i]] += 1
+
+    return total_starts, total_hours, wd_sum, wd_cnt, hw_sum, hw_cnt
+
+
 def perform_analysis(df: pd.DataFrame) -> None:
     """Analyze hydro starts/hours, weekday consumption, and fit a polynomial weekly profile.
 
@@ -233,25 +440,25 @@ def perform_analysis(df: pd.DataFrame) -> None:
         print("Analizė nutraukta: DataFrame tuščias.")
         return
 
-    df = _limit_to_last_6_months(df, "data")
-
-    df["hidro_active"] = df["Hidro"] > 0
-    df["hidro_start"] = df["hidro_active"] & (~df["hidro_active"].shift(1).fillna(False))
-
-    total_starts = int(df["hidro_start"].sum())
-    total_hours = int(df["hidro_active"].sum())
+    total_starts, total_hours, wd_sums, wd_counts, hw_sums, hw_counts = _fused_stats(
+        df["Hidro"].to_numpy(dtype=np.float32, na_value=0.0),
+        df["Vartojimas"].to_numpy(dtype=np.float32, na_value=np.nan),
+        df["data"].dt.dayofweek.to_numpy(dtype=np.int64),
+        df["data"].dt.hour.to_numpy(dtype=np.int64),
+    )
 
-    df["weekday"] = df["data"].dt.day_name()
-    weekday_avg = df.groupby("weekday")["Vartojimas"].mean().sort_values(ascending=False)
+    ranked_days = [d for d in np.argsort(-(wd_sums / np.maximum(wd_counts, 1))) if wd_counts[d]]
+    weekday_avg = pd.Series(
+        wd_sums[ranked_days] / wd_counts[ranked_days],
+        index=pd.Index([WEEKDAY_NAMES[d] for d in ranked_days], name="weekday"),
+    )
     max_weekday = weekday_avg.index[0] if not weekday_avg.empty else "N/A"
 
-    df["hour_of_week"] = df["data"].dt.dayofweek * 24 + df["data"].dt.hour
-    avg_week = df.groupby("hour_of_week")["Vartojimas"].mean().reset_index()
-    x = avg_week["hour_of_week"]
-    y = avg_week["Vartojimas"]
+    x = np.flatnonzero(hw_counts)
+    y = hw_sums[x] / hw_counts[x]
 
-    z = np.polyfit(x, y, 12)
-    p = np.poly1d(z)
+    p = np.polynomial.Polynomial.fit(x, y, 12)
+    z = p.convert().coef[::-1]
 
     plt.figure(figsize=(12, 6))
     plt.plot(x, y, label="Vidutinis vartojimas", color="blue", alpha=0.6)
@@ -291,13 +498,13 @@ Analizės ataskaita (paskutiniai 6 mėnesiai)
 if __name__ == "__main__":
     print("Pradedama Litgrid duomenų analizė...")
 
-    df = fetch_all_data()
+    df = _limit_to_last_6_months(fetch_all_data(), "data")
 
     if not df.empty:
         df = process_data(df)
 
-        df.to_csv("processed_litgrid_data.csv", index=False)
-        print("Apdoroti duomenys išsaugoti: processed_litgrid_data.csv")
+        df.to_parquet("processed_litgrid_data.parquet", compression="zstd", index=False)
+        print("Apdoroti duomenys išsaugoti: processed_litgrid_data.parquet")
 
         create_visualizations(df)
         perform_analysis(df)